@@ -13,6 +13,24 @@ import cv2
 import time
 import configparser
 import os
+import math
+import ctypes
+import copy
+import logging
+from concurrent.futures import ThreadPoolExecutor
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None # numba is optional. Without it, the lifetime calculation falls back to NumPy
+
+cv2.setNumThreads(os.cpu_count() or 1) # debayering is parallelized internally by OpenCV
+
+logger = logging.getLogger(__name__)
+
+# OpenCV demosaicing codes for ImagingParameters.debayer_mode. VNG is not offered since OpenCV only supports it for 8 bit images
+_DEBAYER_CODES = {"bilinear": cv2.COLOR_BAYER_BG2RGB, "edge_aware": cv2.COLOR_BayerBG2RGB_EA}
+
+_settings_cache = {} # (absolute path, modification time in ns, size) -> ImagingParameters successfully parsed from that file
 
 @dataclass
 class ImagingParameters:
@@ -25,9 +43,82 @@ class ImagingParameters:
     exposures_per_frame: int = 10
     end_delay_us: int = 33  # necessary. was determined experimentally
     light_intensity: int = 100  # corrected variable name
+
+    # post-processing parameters
+    fast_debayer: bool = False  # RGB cameras: 2x2 binned debayering (half resolution) instead of full resolution interpolation
+    debayer_mode: str = "bilinear"  # RGB cameras, full resolution debayering: "bilinear" (fastest) or "edge_aware" (better quality)
+    use_gpu: bool = False  # calculate the lifetime image on a CUDA GPU. Requires cupy, falls back to the CPU otherwise
+
+    def controller_command(self):
+        # settings command for the RLD controller, parsed by parseSettings() in Arduino/rld_controller.ino.
+        # built from the current field values on every call: fields are also changed one by one after construction
+        # (e.g. in RLD.load_settings_from_file), so a command cached in __post_init__ could be outdated
+        trigger_window1_us = self.delay_window1_us - 0.75 + self.pulse_width_us
+        trigger_window2_us = self.delay_window2_us - 0.75 + self.pulse_width_us
+        return (f"R,{self.exposure_time_us},{trigger_window1_us},{trigger_window2_us},{self.exposures_per_frame},"
+                f"{self.light_intensity},{self.pulse_width_us},{self.end_delay_us},{self.sets_to_acquire}\n").encode()
+
+    def settings_file_text(self):
+        # contents of a settings.conf file, same format as configparser writes it (read by RLD.load_settings_from_file).
+        # formatted directly, a ConfigParser is not needed for eight values
+        return (f"[ImagingParameters]\n"
+                f"exposure_time_us = {self.exposure_time_us}\n"
+                f"delay_window1_us = {self.delay_window1_us}\n"
+                f"delay_window2_us = {self.delay_window2_us}\n"
+                f"end_delay_us = {self.end_delay_us}\n"
+                f"pulse_width_us = {self.pulse_width_us}\n"
+                f"light_intensity = {self.light_intensity}\n"
+                f"sets_to_acquire = {self.sets_to_acquire}\n"
+                f"exposures_per_frame = {self.exposures_per_frame}\n\n")
         
 
 
+if njit is not None:
+    # fastmath without the nnan/ninf flags, since the kernel writes nan for invalid pixels.
+    # 'afn' lets LLVM use its approximate, vectorized log.
+    @njit(parallel=True, fastmath={'arcp', 'contract', 'afn', 'reassoc', 'nsz'}, cache=True)
+    def _lifetime_kernel(delta_t, arr_window1, arr_window2, out):
+        # per-pixel lifetime on flattened arrays. Same masking as the NumPy path in RLD.calculate_lifetime
+        # delta_t has to be passed with the dtype of the images, no float64 literals in here,
+        # otherwise numba promotes the whole loop (including the log) to double precision
+        for i in prange(out.shape[0]):
+            w2 = arr_window2[i]
+            if w2 != 0:
+                ratio = arr_window1[i] / w2
+                if ratio > 1:
+                    out[i] = delta_t / math.log(ratio)
+                    continue
+            out[i] = np.nan
+
+    # compile once at import, so the first measurement does not pay for the JIT compilation
+    _lifetime_kernel(np.float32(1.0), np.full(4, 2.0, dtype=np.float32), np.ones(4, dtype=np.float32), np.empty(4, dtype=np.float32))
+else:
+    _lifetime_kernel = None
+
+
+_lifetime_gpu_kernel = None # cupy.ElementwiseKernel, created on first use so cupy is only imported when the GPU is used
+
+def _average_lifetime_gpu(delta_t, images):
+    # GPU version of RLD.calculate_average_lifetime. Returns None if cupy is not available
+    global _lifetime_gpu_kernel
+    try:
+        import cupy as cp
+    except ImportError:
+        return None
+    if _lifetime_gpu_kernel is None:
+        # same masking as RLD.calculate_lifetime
+        _lifetime_gpu_kernel = cp.ElementwiseKernel(
+            'T w1, T w2, T dt', 'T out',
+            'out = (w2 != 0 && w1 / w2 > 1) ? dt / log(w1 / w2) : NAN',
+            'lifetime_rld')
+    dark_avg = cp.asarray(images["dark"]).mean(axis=0, dtype=cp.float32)
+    window1_avg = cp.asarray(images["window1"]).mean(axis=0, dtype=cp.float32)
+    window2_avg = cp.asarray(images["window2"]).mean(axis=0, dtype=cp.float32)
+    window1_avg -= dark_avg
+    window2_avg -= dark_avg
+    return cp.asnumpy(_lifetime_gpu_kernel(window1_avg, window2_avg, cp.float32(delta_t)))
+
+
 class RLD:
     def __init__(self):
         # both camera and serial connection are managed outside of this class and passed to it when needed
@@ -35,16 +126,14 @@ class RLD:
         self.serial_connection = None
         self.img = xiapi.Image()
         self.image_dict = {'window1': [], 'window2': [], 'dark' : []} #contains acquired images
+        self.image_stack = None # preallocated (sets, height, width[, 3]) arrays holding the images. image_dict holds views of it
         self.average_lifetime = None 
+        self._average_buffers = {} # float32 averages of each key, reused when the lifetime is recalculated
         self.params = ImagingParameters()
 
         # metadata of acquired images
         self.start_time_ns = None 
         self.end_time_ns = None
-        self.start_time_localtime = None
-        self.start_time_localtime_ms = None #milliseconds part of the start time, for more precise timing (conversion to localtime loses ms)
-        self.end_time_localtime = None
-        self.end_time_localtime_ms = None #milliseconds part of the end time, for more precise timing (conversion to localtime loses ms)
         self.image_start_time_dict = {'window1': [], 'window2': [], 'dark' : []} #timestamps in ns 
 
     #@staticmethod
@@ -112,17 +201,35 @@ class RLD:
             self.camera.set_binning_vertical(2)
             self.camera.set_binning_horizontal(2)
 
+        # preallocate the image buffers for the whole measurement (after binning, which changes the image size)
+        # so that no arrays are allocated while the controller is triggering the camera
+        self.allocate_image_stack()
+
+        # let the API queue a complete measurement in case frames are picked up slower than they are triggered
+        self.camera.set_buffer_policy("XI_BP_SAFE")
+        self.camera.set_buffers_queue_size(min(3 * self.params.sets_to_acquire, self.camera.get_buffers_queue_size_maximum()))
+
 
     def init_rld_controller(self):
         # currently interframe delay is hardcoded in the Arduino firmware to 25 ms
-        settings_str = f"R,{self.params.exposure_time_us},{self.params.delay_window1_us - 0.75 + self.params.pulse_width_us},{self.params.delay_window2_us - 0.75 + self.params.pulse_width_us},{self.params.exposures_per_frame},\
-        {self.params.light_intensity},{self.params.pulse_width_us},{self.params.end_delay_us},{self.params.sets_to_acquire}\n" 
-        self.serial_connection.write(settings_str.encode())
+        self.serial_connection.write(self.params.controller_command())
 
         #print(self.read_until(serial_connection, "END\n"))
 
 
+    def allocate_image_stack(self):
+        # raw (sets, height, width) uint16 stack per key for the current parameters and camera settings
+        height = self.camera.get_height()
+        width = self.camera.get_width()
+        self.image_stack = {key: np.empty((self.params.sets_to_acquire, height, width), dtype=np.uint16) for key in self.image_dict}
+        self.image_start_time_dict = {key: np.zeros(self.params.sets_to_acquire, dtype=np.int64) for key in self.image_dict}
+
     def acquire_images(self):
+        # the stack has to hold exactly the frames of this measurement, since the averages are calculated over the whole stack.
+        # it is outdated if sets_to_acquire or the image size changed since init_camera, or if it holds debayered (RGB) images
+        shape = (self.params.sets_to_acquire, self.camera.get_height(), self.camera.get_width())
+        if self.image_stack is None or any(stack.shape != shape or stack.dtype != np.uint16 for stack in self.image_stack.values()):
+            self.allocate_image_stack()
         self.camera.start_acquisition()
         
         self.serial_connection.write(b"A\n") #send "acquisition" command to RLD controller
@@ -133,23 +240,43 @@ class RLD:
         while current_set < self.params.sets_to_acquire:
             for key in self.image_dict:
                 self.camera.get_image(self.img) 
-                self.image_start_time_dict[key].append(self.camera.get_timestamp()) #timestamp in ns. Not bound to system time, but to camera internal clock -> relative times are accurate
+                self.image_start_time_dict[key][current_set] = self.camera.get_timestamp() #timestamp in ns. Not bound to system time, but to camera internal clock -> relative times are accurate
                 #for xiC cameras it is recorded at the start of the exposure
-                data_raw = self.img.get_image_data_numpy()
-                self.image_dict[key].append(data_raw)
+                frame = self.image_stack[key][current_set]
+                np.copyto(frame, self.image_buffer_view())
+                self.image_dict[key].append(frame)
 
             current_set += 1    
         self.end_time_ns = time.time_ns()
-        print(self.image_start_time_dict)
-        #print timestamps in yyyy-mm-dd hh:mm:ss.ssssss format
         self.camera.stop_acquisition()
+        # console output (especially on Windows) is slow, so it is only produced if debug logging is enabled.
+        # the check also skips formatting the times, since logging arguments are evaluated before the call
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Image timestamps: %s", self.image_start_time_dict)
+            logger.debug("Acquisition started at: %s", self.start_time_str)
+            logger.debug("Acquisition ended at: %s", self.end_time_str)
 
-        self.start_time_localtime = time.localtime(self.start_time_ns / 1e9)
-        self.start_time_localtime_ms = (self.start_time_ns % 1e9) / 1e6
-        self.end_time_localtime = time.localtime(self.end_time_ns / 1e9)
-        self.end_time_localtime_ms = (self.end_time_ns % 1e9) / 1e6
-        print(f"Acquisition started at: {time.strftime('%Y-%m-%d %H:%M:%S', self.start_time_localtime)}:{self.start_time_localtime_ms:.3f}")
-        print(f"Acquisition ended at: {time.strftime('%Y-%m-%d %H:%M:%S', self.end_time_localtime)}:{self.end_time_localtime_ms:.3f}")
+    @staticmethod
+    def format_time_ns(time_ns):
+        # yyyy-mm-dd hh:mm:ss:mmm.uuu (milliseconds added separately, since conversion to localtime loses them)
+        return f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time_ns / 1e9))}:{(time_ns % 1e9) / 1e6:.3f}"
+
+    # local times are only formatted when they are needed (logging, saving)
+    @property
+    def start_time_str(self):
+        return RLD.format_time_ns(self.start_time_ns) if self.start_time_ns else None
+
+    @property
+    def end_time_str(self):
+        return RLD.format_time_ns(self.end_time_ns) if self.end_time_ns else None
+
+    def image_buffer_view(self):
+        # numpy view of the XI_RAW16 image in the API buffer of self.img, without copying it.
+        # img.get_image_data_numpy() first copies the buffer into a bytes object, which would then be copied a second time.
+        # the API reuses the buffer for the next image, so the view has to be copied before calling get_image again
+        row_bytes = self.img.width * 2 + self.img.padding_x
+        buffer = (ctypes.c_char * (row_bytes * self.img.height)).from_address(self.img.bp)
+        return np.ndarray((self.img.height, self.img.width), dtype=np.uint16, buffer=buffer, strides=(row_bytes, 2))
 
     def run(self):
         if self.serial_connection is None or self.camera is None:
@@ -161,8 +288,20 @@ class RLD:
         if self.camera.is_iscolor():
             # debayer images in case of RGB camera
             # must be done before calculating average lifetime since debayering required uint8 or uint16 input
-            for key in self.image_dict:
-                self.image_dict[key] = [cv2.cvtColor(img, cv2.COLOR_BAYER_BG2RGB) for img in self.image_dict[key]]
+            # the RGB images of each key are written into one preallocated array instead of allocating every frame separately
+            debayer_code = _DEBAYER_CODES.get(self.params.debayer_mode)
+            if debayer_code is None:
+                logger.warning("Unknown debayer mode '%s'. Using bilinear debayering.", self.params.debayer_mode)
+                debayer_code = _DEBAYER_CODES["bilinear"]
+            for key, stack in self.image_stack.items():
+                if self.params.fast_debayer:
+                    rgb_stack = RLD.binned_debayer(stack)
+                else:
+                    rgb_stack = np.empty(stack.shape + (3,), dtype=stack.dtype)
+                    for i in range(stack.shape[0]):
+                        cv2.demosaicing(stack[i], debayer_code, dst=rgb_stack[i])
+                self.image_stack[key] = rgb_stack # the raw images are not needed after debayering
+                self.image_dict[key] = list(rgb_stack)
         self.calculate_average_lifetime()
 
 #endregion
@@ -172,6 +311,13 @@ class RLD:
     def load_settings_from_file(self, config_path="settings.conf"):
         settings = configparser.ConfigParser()
         if os.path.exists(config_path):
+            # a modified file gets a new key, so the cache never returns outdated settings. the size is part of the key
+            # since filesystems with coarse timestamps (FAT/exFAT) can give a file rewritten within one tick the same mtime
+            stat = os.stat(config_path)
+            cache_key = (os.path.abspath(config_path), stat.st_mtime_ns, stat.st_size)
+            if cache_key in _settings_cache:
+                self.params = copy.copy(_settings_cache[cache_key])
+                return 0 # success
             settings.read(config_path)
             params = ImagingParameters()
             if 'ImagingParameters' in settings:
@@ -194,6 +340,7 @@ class RLD:
                     return -1 # missing parameters in config file
                        
                 self.params = params  # Update self.params if valid
+                _settings_cache[cache_key] = copy.copy(params)
                 return 0 # success
 
             elif "Settings" in settings: #legacy support
@@ -213,29 +360,42 @@ class RLD:
                 if any(value == -1 for value in vars(params).values()):
                     return -1
                 self.params = params  # Update self.params if valid      
+                _settings_cache[cache_key] = copy.copy(params)
                 return 0          
             
         return None
 
     def load_images_from_folder(self, data_folder_path):
-        window1_images = []
-        window2_images = [] 
-        dark_images = []
+        window1_paths = []
+        window2_paths = [] 
+        dark_paths = []
         #at the moment, this does not load lifetime images, only raw images. lifetime images can be calculated after loading
         #config file is needed for lifetime calculation from the loaded raw images + parameters
         config_path = ""
-        for file_name in os.listdir(data_folder_path):
-            if file_name.__contains__("window1_") and file_name.endswith(".tif"):
-                #print("loading window1:", file_name)
-                window1_images.append(cv2.imread(os.path.join(data_folder_path, file_name), cv2.IMREAD_UNCHANGED))
-            elif file_name.__contains__("window2_") and file_name.endswith(".tif"):
-                #print("loading window2:", file_name)
-                window2_images.append(cv2.imread(os.path.join(data_folder_path, file_name), cv2.IMREAD_UNCHANGED))
-            elif (file_name.startswith("dark_") or file_name.__contains__("background_")) and file_name.endswith(".tif"): #background_ for legacy reasons
-                #print("loading dark:", file_name)
-                dark_images.append(cv2.imread(os.path.join(data_folder_path, file_name), cv2.IMREAD_UNCHANGED))
-        #    elif file_name.endswith(".conf"):
-        #        config_path = os.path.join(data_folder_path, file_name)
+        self.image_stack = None
+        # scandir entries already carry the full path and file type, so no extra join/stat per file is needed
+        with os.scandir(data_folder_path) as entries:
+            for entry in entries:
+                file_name = entry.name
+                if not file_name.endswith(".tif") or not entry.is_file():
+                    continue
+                if "window1_" in file_name:
+                    window1_paths.append(entry.path)
+                elif "window2_" in file_name:
+                    window2_paths.append(entry.path)
+                elif file_name.startswith("dark_") or "background_" in file_name: #background_ for legacy reasons
+                    dark_paths.append(entry.path)
+            #    elif file_name.endswith(".conf"):
+            #        config_path = entry.path
+
+        # cv2.imread releases the GIL, so reading and decoding the files in threads overlaps disk I/O and decoding.
+        # all files go into one pool, sorted so the image order does not depend on the directory listing
+        paths = sorted(window1_paths) + sorted(window2_paths) + sorted(dark_paths)
+        with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as executor:
+            loaded_images = list(executor.map(lambda path: cv2.imread(path, cv2.IMREAD_UNCHANGED), paths))
+        window1_images = loaded_images[:len(window1_paths)]
+        window2_images = loaded_images[len(window1_paths):len(window1_paths) + len(window2_paths)]
+        dark_images = loaded_images[len(window1_paths) + len(window2_paths):]
 
         if not window1_images or not window2_images or not dark_images:
             #print("Error: Missing image sets in the selected folder.")
@@ -243,42 +403,123 @@ class RLD:
         elif len(window1_images) != len(window2_images) or len(window1_images) != len(dark_images) or len(window2_images) != len(dark_images):
             #print("Error: Unequal number of images in the sets.")
             self.image_dict = {'window1': window1_images, 'window2': window2_images, 'dark': dark_images} 
+            self.stack_image_dict()
             # lifetime can still be calculated from unequal sets, but user should be warned
             return -1
         else:
             self.image_dict = {'window1': window1_images, 'window2': window2_images, 'dark': dark_images}
+            self.stack_image_dict()
             return 0
         #config_file_status = self.load_settings_from_file(config_path)
 
         #return config_file_status # None if no config file found, -1 if missing parameters, -2 if corrupt, 0 if success
 
+    def stack_image_dict(self):
+        # copy the images of each key into one contiguous (n, height, width[, 3]) array, like the acquisition does,
+        # and replace the lists in image_dict by views of it
+        try:
+            self.image_stack = {key: np.stack(images) for key, images in self.image_dict.items()}
+        except ValueError: # images of different size (or unreadable files): keep the separate arrays
+            self.image_stack = None
+            return
+        self.image_dict = {key: list(stack) for key, stack in self.image_stack.items()}
+
 #endregion
 
 
 # region post-processing
 
+    @staticmethod
+    def binned_debayer(raw):
+        # debayers each 2x2 Bayer cell (R G / G B, same layout as cv2.COLOR_BAYER_BG2RGB) into one RGB pixel.
+        # half the resolution of cv2.cvtColor but no interpolation and 4x fewer pixels for the lifetime calculation.
+        # works on single images (height, width) and stacks (n, height, width)
+        height = raw.shape[-2] // 2 * 2
+        width = raw.shape[-1] // 2 * 2
+        raw = raw[..., :height, :width]
+        rgb = np.empty(raw.shape[:-2] + (height // 2, width // 2, 3), dtype=raw.dtype)
+        rgb[..., 0] = raw[..., 0::2, 0::2]
+        green = raw[..., 0::2, 1::2].astype(np.uint32)
+        green += raw[..., 1::2, 0::2]
+        green >>= 1
+        rgb[..., 1] = green
+        rgb[..., 2] = raw[..., 1::2, 1::2]
+        return rgb
+
     @staticmethod
     def arr_replace_negatives_by_nan(arr):
-        arr_copy = np.copy(arr)*1.0
+        arr_copy = arr.astype(np.float32, copy=True) # single allocation; float32 is plenty for 16 bit image data
         arr_copy[arr_copy < 0] = np.nan
         return arr_copy
 
     @staticmethod
     def arr_replace_zeroes_by_nan(arr):
-        arr_copy = np.copy(arr)*1.0
+        arr_copy = arr.astype(np.float32, copy=True)
         arr_copy[arr_copy == 0] = np.nan
         return arr_copy
 
     @staticmethod
-    def calculate_lifetime(delta_t, arr_window1, arr_window2):
-        return delta_t / RLD.arr_replace_negatives_by_nan(RLD.arr_replace_zeroes_by_nan((np.log(RLD.arr_replace_zeroes_by_nan(arr_window1) / RLD.arr_replace_zeroes_by_nan(arr_window2)))))
+    def calculate_lifetime(delta_t, arr_window1, arr_window2, out=None):
+        # lifetime = delta_t / log(window1 / window2), computed without intermediate copies of the image.
+        # pixels where window2 is zero or log(ratio) is zero/negative (i.e. ratio <= 1) are set to nan,
+        # which is the same result the former chain of arr_replace_* calls produced
+        arr_window1 = np.asarray(arr_window1)
+        arr_window2 = np.asarray(arr_window2)
+        shape = np.broadcast_shapes(arr_window1.shape, arr_window2.shape)
+        dtype = np.result_type(arr_window1, arr_window2, np.float32)
+        if out is None or out.shape != shape or out.dtype != dtype or not out.flags.c_contiguous:
+            out = np.empty(shape, dtype=dtype)
+        if _lifetime_kernel is not None and arr_window1.shape == arr_window2.shape == shape:
+            _lifetime_kernel(out.dtype.type(delta_t), np.ascontiguousarray(arr_window1).reshape(-1), np.ascontiguousarray(arr_window2).reshape(-1), out.reshape(-1))
+            return out
+        out.fill(np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            np.divide(arr_window1, arr_window2, out=out, where=arr_window2 != 0)
+            # pixels with window2 == 0 are already nan. once the ratios <= 1 are nan too, log and division
+            # just propagate nan, so no further masks are needed
+            np.copyto(out, np.nan, where=out <= 1)
+            np.log(out, out=out)
+            np.divide(delta_t, out, out=out)
+        return out
+
+    @staticmethod
+    def average_images(images, out=None):
+        # float32 average of a stack or list of images. out is reused if it has the right shape
+        shape = images.shape[1:] if isinstance(images, np.ndarray) else images[0].shape
+        if out is None or out.shape != shape or out.dtype != np.float32:
+            out = np.empty(shape, dtype=np.float32)
+        if isinstance(images, np.ndarray):
+            # already one contiguous (n, height, width[, 3]) stack, reduce it directly
+            if images.dtype.kind == 'u' and images.dtype.itemsize <= 2:
+                # 8/16 bit camera data: sum in uint32 (exact, no overflow below 65537 images), then scale once to float32
+                image_sum = np.sum(images, axis=0, dtype=np.uint32)
+                return np.multiply(image_sum, np.float32(1 / images.shape[0]), out=out, dtype=np.float32)
+            return np.mean(images, axis=0, dtype=np.float32, out=out)
+        # running float32 sum instead of np.average(images, axis=0), which first stacks the whole list into a new array
+        out.fill(0)
+        for img in images:
+            np.add(out, img, out=out)
+        out /= len(images)
+        return out
 
     def calculate_average_lifetime(self):
         delta_t = self.params.delay_window2_us - self.params.delay_window1_us
-        dark_avg = np.average(self.image_dict["dark"], axis=0)
-        window1_avg = np.average(self.image_dict["window1"], axis=0) - dark_avg
-        window2_avg = np.average(self.image_dict["window2"], axis=0) - dark_avg
-        self.average_lifetime = RLD.calculate_lifetime(delta_t, window1_avg, window2_avg)
+        images = self.image_stack if self.image_stack is not None else self.image_dict
+        if self.params.use_gpu:
+            average_lifetime = _average_lifetime_gpu(delta_t, images)
+            if average_lifetime is not None:
+                self.average_lifetime = average_lifetime
+                return
+            logger.warning("cupy not available. Calculating lifetime on the CPU.")
+        # averages and dark subtraction write into the buffers of the previous calculation (if any), no new arrays
+        dark_avg = RLD.average_images(images["dark"], out=self._average_buffers.get("dark"))
+        window1_avg = RLD.average_images(images["window1"], out=self._average_buffers.get("window1"))
+        window2_avg = RLD.average_images(images["window2"], out=self._average_buffers.get("window2"))
+        np.subtract(window1_avg, dark_avg, out=window1_avg)
+        np.subtract(window2_avg, dark_avg, out=window2_avg)
+        self._average_buffers = {"dark": dark_avg, "window1": window1_avg, "window2": window2_avg}
+        # reuse the previous result buffer if this instance already holds a lifetime image of the same shape
+        self.average_lifetime = RLD.calculate_lifetime(delta_t, window1_avg, window2_avg, out=self.average_lifetime)
 
 # endregion
 
@@ -10,24 +10,56 @@ import sys
 from PySide6.QtWidgets import QApplication, QMainWindow, QLabel, QFileDialog, QMessageBox
 from PySide6.QtUiTools import QUiLoader
 from PySide6.QtGui import QPixmap, QImage
-from PySide6.QtCore import QFile, QSize, Qt #QTimer
+from PySide6.QtCore import QFile, QSize, Qt, QTimer, QThread, QSignalBlocker, Signal
 from usb_watcher import USBWatcher
 import re
 import serial
 import RLD_manager
 from RLD_manager import ImagingParameters  # Import the ImagingParameters class
-import matplotlib.pyplot as plt
+from matplotlib import colormaps # only the colormap registry, pyplot is not needed
 import numpy as np
 import cv2
-import configparser
 import time
+import copy
+from concurrent.futures import ThreadPoolExecutor, wait
 from ximea import xiapi
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None # numba is optional. Without it, colormapped previews are normalized with OpenCV and a NumPy lookup
 
 # Change cwd to file directory
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
 
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _normalize_colormap_kernel(arr, vmin, scale, lut, out):
+        # normalizes a single channel image to 0..255 and applies the colormap in one pass over the pixels (parallel over rows).
+        # nan pixels are written black. same result as the OpenCV/NumPy path in ImageLabel.normalize_image
+        for i in prange(arr.shape[0]):
+            for j in range(arr.shape[1]):
+                v = arr[i, j]
+                if v != v:
+                    out[i, j, 0] = 0
+                    out[i, j, 1] = 0
+                    out[i, j, 2] = 0
+                else:
+                    x = (v - vmin) * scale
+                    k = 0 if x <= 0 else (255 if x >= 255 else int(x + 0.5))
+                    out[i, j, 0] = lut[k, 0]
+                    out[i, j, 1] = lut[k, 1]
+                    out[i, j, 2] = lut[k, 2]
+
+    # compile once at import for float32 (lifetime) images, so the first lifetime preview does not stall the GUI for the JIT compilation
+    _normalize_colormap_kernel(np.ones((2, 2), dtype=np.float32), 0.0, 255.0, np.zeros((256, 3), dtype=np.uint8), np.empty((2, 2, 3), dtype=np.uint8))
+else:
+    _normalize_colormap_kernel = None
+
+
 class ImageLabel(QLabel):
+    _cmap_luts = {} # colormap name -> (256, 3) uint8 RGB lookup table, shared by all labels
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setMouseTracking(True)
@@ -36,65 +68,182 @@ class ImageLabel(QLabel):
         self.vmax = None
         self.cmap = 'gray'
         self._last_pixmap = None
+        # normalized and colormapped uint8 image at full resolution, reused as long as image data, range and colormap stay the same.
+        # the key contains the data pointer rather than id(array), since the previews pass a new view object on every call.
+        # (image_array keeps the data alive, so the pointer cannot be reused by another image while it is cached)
+        self._normalized_image = None
+        self._cache_key = None
+        self._qimage_buf = None # QImage the scaled preview is written into, reused as long as size and format stay the same
+        # mapping from label to image coordinates of the shown pixmap (x_offset, y_offset, pix_w, pix_h, img_h, img_w)
+        self._map_params = None
+        # tooltip updates are debounced, and skipped if the pointed pixel did not change
+        self._last_tt_coord = None
+        self._pending_tooltip = ""
+        self._tooltip_timer = QTimer(self)
+        self._tooltip_timer.setSingleShot(True)
+        self._tooltip_timer.setInterval(30)
+        self._tooltip_timer.timeout.connect(lambda: self.setToolTip(self._pending_tooltip))
+        self._in_resize = False # guards against setPixmap triggering nested resizeEvents
         self.setAlignment(Qt.AlignCenter)
 
     def sizeHint(self):
         return QSize(257, 188) 
 
+    @classmethod
+    def colormap_lut(cls, cmap):
+        # the matplotlib colormap is only evaluated once (on 256 values) per colormap, not on every image
+        lut = cls._cmap_luts.get(cmap)
+        if lut is None:
+            lut = (colormaps[cmap](np.linspace(0, 1, 256))[:, :3] * 255).astype(np.uint8)
+            cls._cmap_luts[cmap] = lut
+        return lut
+
     def set_image(self, array, vmin=None, vmax=None, cmap='gray'):
         self.image_array = array
-        self.vmin = vmin if vmin is not None else np.min(array)
-        self.vmax = vmax if vmax is not None else np.max(array)
+        if vmin is None or vmax is None:
+            # minimum and maximum in a single OpenCV pass instead of two numpy reductions (RGB images are flattened to one channel)
+            array_min, array_max, _, _ = cv2.minMaxLoc(array if array.ndim == 2 else array.reshape(-1))
+        self.vmin = vmin if vmin is not None else array_min
+        self.vmax = vmax if vmax is not None else array_max
         self.cmap = cmap
-        # Normalize and apply colormap
-        array = array.astype(np.float32)  # Prevent overflow
-        norm = np.clip((array - self.vmin) / (self.vmax - self.vmin), 0, 1)
-        if cmap == 'gray':
-            img_8bit = (norm * 255).astype(np.uint8)
-            qimg = QImage(img_8bit.data, img_8bit.shape[1], img_8bit.shape[0], img_8bit.strides[0], QImage.Format_Grayscale8)
+        cache_key = (array.__array_interface__['data'][0], array.shape, array.strides, array.dtype, float(self.vmin), float(self.vmax), cmap)
+        if cache_key != self._cache_key or self._normalized_image is None:
+            self._normalized_image = self.normalize_image(array, cmap)
+            self._cache_key = cache_key
+        self.show_scaled_pixmap()
+
+    def normalize_image(self, array, cmap):
+        # returns the image scaled to vmin..vmax and colormapped as full resolution uint8 array (grayscale or RGB)
+        # Normalize to 0..255 in one OpenCV pass directly on the image data (no float copy): (array - vmin) * 255 / (vmax - vmin).
+        # convertScaleAbs takes the absolute value before saturating to uint8, so values below vmin are clamped to vmin first
+        if cmap != 'gray' and _normalize_colormap_kernel is not None and array.ndim == 2 and self.vmax > self.vmin:
+            # with numba, normalization, colormap and nan handling are fused into a single parallel pass
+            img_rgb = np.empty(array.shape + (3,), dtype=np.uint8)
+            _normalize_colormap_kernel(array, float(self.vmin), 255.0 / (self.vmax - self.vmin), self.colormap_lut(cmap), img_rgb)
+            return img_rgb
+        if self.vmax <= self.vmin:
+            # empty or inverted range (sliders dragged past each other): everything at the lower end of the colormap.
+            # a negative scale would otherwise be turned into a mirrored image by the absolute value
+            img_8bit = np.zeros(array.shape[:2], dtype=np.uint8)
         else:
-            cmapped = plt.get_cmap(cmap)(norm)
-            img_8bit = (cmapped[:, :, :3] * 255).astype(np.uint8)
-            qimg = QImage(img_8bit.data, img_8bit.shape[1], img_8bit.shape[0], img_8bit.strides[0], QImage.Format_RGB888)
-        # Scale image to label size
-        pixmap = QPixmap.fromImage(qimg)
-        scaled_pixmap = pixmap.scaled(self.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            scale = 255.0 / (self.vmax - self.vmin)
+            img_8bit = cv2.convertScaleAbs(cv2.max(array, float(self.vmin)), alpha=scale, beta=-self.vmin * scale)
+        if cmap != 'gray':
+            img_8bit = self.colormap_lut(cmap)[img_8bit]
+            if array.dtype.kind == 'f':
+                img_8bit[np.isnan(array)] = 0 # invalid pixels (e.g. in lifetime images) in black, like matplotlib's 'bad' color
+        return img_8bit
+
+    def show_scaled_pixmap(self):
+        # Scale image to label size (keeping the aspect ratio) with OpenCV on the uint8 image, before it is wrapped into a QImage.
+        # INTER_AREA is much faster than Qt's SmoothTransformation and gives better downsampling than bilinear
+        img = self._normalized_image
+        h, w = img.shape[:2]
+        lbl_w, lbl_h = self.width(), self.height()
+        if lbl_h * w // h <= lbl_w: # same integer arithmetic as Qt's KeepAspectRatio
+            tw, th = max(1, lbl_h * w // h), max(1, lbl_h)
+        else:
+            tw, th = max(1, lbl_w), max(1, lbl_w * h // w)
+        fmt = QImage.Format_Grayscale8 if img.ndim == 2 else QImage.Format_RGB888
+        if self._qimage_buf is None or self._qimage_buf.size() != QSize(tw, th) or self._qimage_buf.format() != fmt:
+            self._qimage_buf = QImage(tw, th, fmt)
+        # numpy view on the QImage pixels (rows are padded to 4 bytes), OpenCV writes the scaled image directly into it.
+        # bits() is requested on every call: if a previous pixmap still shares the data, Qt detaches the image first
+        bpl = self._qimage_buf.bytesPerLine()
+        if img.ndim == 2:
+            dst = np.ndarray((th, tw), np.uint8, buffer=self._qimage_buf.bits(), strides=(bpl, 1))
+        else:
+            dst = np.ndarray((th, tw, 3), np.uint8, buffer=self._qimage_buf.bits(), strides=(bpl, 3, 1))
+        if (tw, th) != (w, h):
+            cv2.resize(img, (tw, th), dst=dst, interpolation=cv2.INTER_AREA if tw < w else cv2.INTER_LINEAR)
+        else:
+            np.copyto(dst, img)
+        # the pixmap already has the final size
+        scaled_pixmap = QPixmap.fromImage(self._qimage_buf).scaled(self.size(), Qt.KeepAspectRatio, Qt.FastTransformation)
         self.setPixmap(scaled_pixmap)
         self.setScaledContents(False)
         self._last_pixmap = scaled_pixmap
+        pix_w, pix_h = scaled_pixmap.width(), scaled_pixmap.height()
+        self._map_params = ((self.width() - pix_w) // 2, (self.height() - pix_h) // 2, pix_w, pix_h, h, w)
+        self._last_tt_coord = -1 # unknown: the value under the pointer may have changed, update on the next move
         self.setAlignment(Qt.AlignCenter)
 
     def mouseMoveEvent(self, event):
-        if self.image_array is not None and self._last_pixmap is not None:
+        coord = None
+        if self.image_array is not None and self._map_params is not None:
+            x_offset, y_offset, pix_w, pix_h, img_h, img_w = self._map_params
             # Qt6: position() returns QPointF
             pt = event.position().toPoint()
-            x, y = pt.x(), pt.y()
-            lbl_w = self.width()
-            lbl_h = self.height()
-            pix_w = self._last_pixmap.width()
-            pix_h = self._last_pixmap.height()
-            x_offset = (lbl_w - pix_w) // 2
-            y_offset = (lbl_h - pix_h) // 2
-            if x_offset <= x < x_offset + pix_w and y_offset <= y < y_offset + pix_h:
-                img_x = (x - x_offset) * self.image_array.shape[1] // pix_w
-                img_y = (y - y_offset) * self.image_array.shape[0] // pix_h
-                img_x = max(0, min(self.image_array.shape[1] - 1, img_x))
-                img_y = max(0, min(self.image_array.shape[0] - 1, img_y))
-                value = self.image_array[img_y, img_x]
-                self.setToolTip(f"({img_x}, {img_y}): {value}")
+            x, y = pt.x() - x_offset, pt.y() - y_offset
+            if 0 <= x < pix_w and 0 <= y < pix_h:
+                coord = (min(img_w - 1, x * img_w // pix_w), min(img_h - 1, y * img_h // pix_h))
+        if coord != self._last_tt_coord:
+            self._last_tt_coord = coord
+            if coord is None:
+                self._pending_tooltip = ""
             else:
-                self.setToolTip("")
-        else:
-            self.setToolTip("")
+                img_x, img_y = coord
+                self._pending_tooltip = f"({img_x}, {img_y}): {self.image_array[img_y, img_x]}"
+            self._tooltip_timer.start()
         super().mouseMoveEvent(event)
 
+    def clear(self):
+        # forget the image, so that a resize does not bring it back
+        self.image_array = None
+        self._normalized_image = None
+        self._cache_key = None
+        self._qimage_buf = None
+        self._last_pixmap = None
+        self._map_params = None
+        self._last_tt_coord = None
+        self._tooltip_timer.stop()
+        self.setToolTip("")
+        super().clear()
+
     def resizeEvent(self, event):
-        # Redraw image on resize and keep centered
-        if self.image_array is not None:
-            self.set_image(self.image_array, vmin=self.vmin, vmax=self.vmax, cmap=self.cmap)
+        # Only rescale the already normalized image on resize (never normalize again) and keep centered.
+        # setPixmap can cause another layout pass and resize, which is ignored while the first one is handled
+        if self._normalized_image is not None and not self._in_resize:
+            self._in_resize = True
+            try:
+                self.show_scaled_pixmap()
+            finally:
+                self._in_resize = False
         self.setAlignment(Qt.AlignCenter)
         super().resizeEvent(event)
 
+ImageLabel.colormap_lut('plasma') # colormap of the lifetime preview, built once at import
+
+class CamOpenWorker(QThread):
+    """Opens the camera in the background, since open_device() blocks for several seconds. QThread.finished is emitted when done."""
+
+    def __init__(self, camera):
+        super().__init__()
+        self.camera = camera
+
+    def run(self):
+        self.camera.open_device()
+
+
+class MeasurementLoadWorker(QThread):
+    """Loads a measurement folder (images and settings) into a new RLD instance in the background.
+    The lifetime is calculated afterwards on the GUI thread: the parallel numba kernels must not run from two threads at once."""
+    ready = Signal(object, object, object)  # RLD instance, status of load_images_from_folder, status of load_settings_from_file
+
+    def __init__(self, folder):
+        super().__init__()
+        self.folder = folder
+
+    def run(self):
+        rld = RLD_manager.RLD()
+        load_image_status = rld.load_images_from_folder(self.folder)
+        config_file_status = None
+        if load_image_status is not None: # images were found
+            config_path = next((os.path.join(self.folder, f) for f in os.listdir(self.folder) if f.endswith('.conf')), "")
+            config_file_status = rld.load_settings_from_file(config_path)
+        self.ready.emit(rld, load_image_status, config_file_status)
+
+
 def debug_sizes(ui):
     print(f"Main window size: {ui.size()}")
     print(f"Central widget size: {ui.centralwidget.size()}")
@@ -116,6 +265,8 @@ def debug_image_label(label, name):
 
 
 class MainWindow(QMainWindow):
+    image_write_failed = Signal(str)  # emitted from the background writer threads, handled on the GUI thread
+
     def __init__(self):
         super(MainWindow, self).__init__()
 
@@ -135,6 +286,24 @@ class MainWindow(QMainWindow):
         self.usb_watcher.start()
         self.rld = RLD_manager.RLD()  # Initialize RLD manager.
         self.rld_list = []  #for recalling previous measurements in the session if needed. We only add to this list if we measure a new image set or load a previous one.
+        self._channel_cache = {}  # preview name -> (source image, extracted first channel), see preview_channel()
+        # label, min and max spinbox of each preview, looked up once instead of on every redraw
+        self._preview_widgets = {name: (getattr(self.ui, f"{name}_lbl"), getattr(self.ui, f"{name}_min_sb"), getattr(self.ui, f"{name}_max_sb"))
+                                 for name in ("window1", "window2", "dark", "lifetime")}
+        # writes image files in the background. TIFF encoding in OpenCV releases the GIL, so the files are written in parallel
+        # and the GUI stays responsive. pending writes are finished before the interpreter exits
+        self.save_executor = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1))
+        self.save_futures = []  # writes that are not finished yet. failed writes are reported through image_write_failed
+        # the writes must be finished while the window (which receives image_write_failed) still exists
+        QApplication.instance().aboutToQuit.connect(self.wait_for_pending_writes)
+        # failed writes are collected for a moment and reported in a single message box (a failing save, e.g. disk full,
+        # usually fails for every image)
+        self._write_errors = []
+        self._write_error_timer = QTimer(self)
+        self._write_error_timer.setSingleShot(True)
+        self._write_error_timer.setInterval(200)
+        self._write_error_timer.timeout.connect(self.show_write_errors)
+        self.image_write_failed.connect(self.on_image_write_failed)
 
 
         config_file_status = self.rld.load_settings_from_file()  # Load settings from config file
@@ -144,9 +313,10 @@ class MainWindow(QMainWindow):
         # the camera and serial connection are opened/closed in the main window class
         # other classes only get a reference to the camera/serial connection to use them
         self.camera = xiapi.Camera()
-        if self.camera.get_number_devices() > 0:
+        self._cam_open_worker = None
+        if self.usb_watcher.number_of_cameras > 0: # from the USB enumeration, xiapi's get_number_devices() would query the devices again
             # no multi-camera support for now - open the first camera found
-            self.camera.open_device()  # blocking and therefore significantly slows down startup (~4 sec) if a camera is connected.
+            self.open_camera()  # takes ~4 sec, therefore done in the background so that the window shows up immediately
         self.serial_connection = None  # Placeholder for serial connection
         if self.usb_watcher.number_of_controllers > 0:
             self.connect_serial()
@@ -155,16 +325,14 @@ class MainWindow(QMainWindow):
         #print(dir(self.ui))  # This will list all the attributes (widgets) in the loaded UI
 
         self.update_camera_status_lbl()
+        self.connect_parameter_spinboxes()
         self.extract_gui_inputs()  # Extract initial GUI inputs
         self.connect_buttons()
         self.connect_combo_boxes()
         self.connect_sliders_and_spinboxes()
         self.plot_preview_images()
         self.connect_preview_signals()
-        if self.camera.CAM_OPEN and self.serial_connection and self.serial_connection.is_open:
-            self.ui.image_tau_btn.setEnabled(True)
-        else:
-            self.ui.image_tau_btn.setEnabled(False)
+        self.update_image_tau_btn()
 
     def apply_settings_to_gui(self):
         self.ui.exposure_sb.setValue(self.rld.params.exposure_time_us)
@@ -192,13 +360,30 @@ class MainWindow(QMainWindow):
             self.ui.camera_status_lbl.setText("✅")
             #print("set label to check")
         elif self.usb_watcher.number_of_cameras > 0:
-            self.ui.camera_status_lbl.setText("🔌") # at the moment, this is never displayed because camera.open_device() blocks repaint of the widget (also freezes everything else)
-            #could be fixed by threading the camera opening, but not a high priority at the moment
+            self.ui.camera_status_lbl.setText("🔌") # displayed while the camera is being opened
             #print("set label to plug")
         else:
             self.ui.camera_status_lbl.setText("❌")
             #print("set label to cross")
 
+    def update_image_tau_btn(self):
+        # Enable or disable measurement button based on both devices being connected
+        if self.camera.CAM_OPEN and self.serial_connection and self.serial_connection.is_open:
+            self.ui.image_tau_btn.setEnabled(True)
+        else:
+            self.ui.image_tau_btn.setEnabled(False)
+
+    def open_camera(self):
+        if self._cam_open_worker is not None and self._cam_open_worker.isRunning():
+            return # already being opened
+        self._cam_open_worker = CamOpenWorker(self.camera)
+        self._cam_open_worker.finished.connect(self.on_camera_opened)
+        self._cam_open_worker.start()
+
+    def on_camera_opened(self):
+        self.update_camera_status_lbl()
+        self.update_image_tau_btn()
+
     def connect_serial(self):
         if self.usb_watcher.number_of_controllers > 0:
             #print("controller found")
@@ -225,34 +410,29 @@ class MainWindow(QMainWindow):
         
         if action == "added":
             #print(f"USB event: {action} - {type_of_device}")
-            if "controller" in type_of_device:
+            if type_of_device == "controller":
                 if self.serial_connection is None:
                     self.connect_serial()
 
-            if "camera" in type_of_device:
-                if not self.camera.CAM_OPEN and self.camera.get_number_devices() > 0:
-                    self.camera.open_device()
+            if type_of_device == "camera":
+                if not self.camera.CAM_OPEN and self.usb_watcher.number_of_cameras > 0:
+                    self.open_camera()
         if action == "removed":
             #print(f"USB event: {action} - {type_of_device}")
-            if "controller" in type_of_device:
+            if type_of_device == "controller":
                 #not a super clean solution, but it works for now
                 #problem: user could connect multiple controllers
                 if self.serial_connection and self.serial_connection.is_open:
                     self.serial_connection.close()
                 self.serial_connection = None            
-            if "camera" in type_of_device:
+            if type_of_device == "camera":
                 if self.camera.CAM_OPEN:
                     # Close camera safely. camera.is_isexist() throws an error if the camera is already removed but CAM_OPEN is still True 
                     # is_isexist() seems completely useless
                     self.camera.close_device()
         self.update_controller_status_lbl()
         self.update_camera_status_lbl()
-
-        # Enable or disable measurement button based on both devices being connected
-        if self.camera.CAM_OPEN and self.serial_connection and self.serial_connection.is_open:
-            self.ui.image_tau_btn.setEnabled(True)
-        else:
-            self.ui.image_tau_btn.setEnabled(False)
+        self.update_image_tau_btn()
 
 
 #endregion
@@ -274,121 +454,101 @@ class MainWindow(QMainWindow):
 
     def connect_sliders_and_spinboxes(self):
         """Synchronize sliders and spinboxes."""
-        # Window 1
-        self.ui.window1_min_hs.valueChanged.connect(self.ui.window1_min_sb.setValue)
-        self.ui.window1_min_sb.valueChanged.connect(self.ui.window1_min_hs.setValue)
-        self.ui.window1_max_hs.valueChanged.connect(self.ui.window1_max_sb.setValue)
-        self.ui.window1_max_sb.valueChanged.connect(self.ui.window1_max_hs.setValue)
-
-        # Window 2
-        self.ui.window2_min_hs.valueChanged.connect(self.ui.window2_min_sb.setValue)
-        self.ui.window2_min_sb.valueChanged.connect(self.ui.window2_min_hs.setValue)
-        self.ui.window2_max_hs.valueChanged.connect(self.ui.window2_max_sb.setValue)
-        self.ui.window2_max_sb.valueChanged.connect(self.ui.window2_max_hs.setValue)
-
-        # Dark Frame
-        self.ui.dark_min_hs.valueChanged.connect(self.ui.dark_min_sb.setValue)
-        self.ui.dark_min_sb.valueChanged.connect(self.ui.dark_min_hs.setValue)
-        self.ui.dark_max_hs.valueChanged.connect(self.ui.dark_max_sb.setValue)
-        self.ui.dark_max_sb.valueChanged.connect(self.ui.dark_max_hs.setValue)
-
-        # Decay Time
-        self.ui.lifetime_min_hs.valueChanged.connect(self.ui.lifetime_min_sb.setValue)
-        self.ui.lifetime_min_sb.valueChanged.connect(self.ui.lifetime_min_hs.setValue)
-        self.ui.lifetime_max_hs.valueChanged.connect(self.ui.lifetime_max_sb.setValue)
-        self.ui.lifetime_max_sb.valueChanged.connect(self.ui.lifetime_max_hs.setValue)
+        # Window 1, Window 2, Dark Frame, Decay Time
+        for name in ("window1", "window2", "dark", "lifetime"):
+            self._link_pair(getattr(self.ui, f"{name}_min_hs"), getattr(self.ui, f"{name}_min_sb"))
+            self._link_pair(getattr(self.ui, f"{name}_max_hs"), getattr(self.ui, f"{name}_max_sb"))
 
         #delay spinboxes
-        self.ui.delay1_sb.editingFinished.connect(self.validate_delay1_sb)
-        self.ui.delay2_sb.editingFinished.connect(self.validate_delay2_sb)
-        self.ui.pulse_width_sb.editingFinished.connect(self.validate_pulse_width_sb)
+        for sb in (self.ui.delay1_sb, self.ui.delay2_sb, self.ui.pulse_width_sb):
+            sb.editingFinished.connect(lambda sb=sb: self._snap_16th(sb))
+
+    @staticmethod
+    def _link_pair(hs, sb):
+        # the linked widget is updated with its signals blocked, so the change is not echoed back
+        # (the preview redraw is triggered by the widget the user changed)
+        def set_value_blocked(widget, value):
+            with QSignalBlocker(widget):
+                widget.setValue(value)
+        hs.valueChanged.connect(lambda value: set_value_blocked(sb, value))
+        sb.valueChanged.connect(lambda value: set_value_blocked(hs, value))
+
+    # imaging parameter spinbox -> ImagingParameters field
+    PARAMETER_SPINBOXES = (("exposure_sb", "exposure_time_us"), ("delay1_sb", "delay_window1_us"), ("delay2_sb", "delay_window2_us"),
+                           ("end_delay_sb", "end_delay_us"), ("pulse_width_sb", "pulse_width_us"), ("light_intensity_sb", "light_intensity"),
+                           ("sets_to_acquire_sb", "sets_to_acquire"), ("exposures_per_frame_sb", "exposures_per_frame"))
+
+    def connect_parameter_spinboxes(self):
+        # gui_params follows the spinboxes as they change, so the parameters do not have to be read back from the GUI
+        # for every measurement/save. It is separate from self.rld.params, which belong to the shown measurement
+        self.gui_params = ImagingParameters(**{field: getattr(self.ui, widget).value() for widget, field in self.PARAMETER_SPINBOXES})
+        for widget, field in self.PARAMETER_SPINBOXES:
+            getattr(self.ui, widget).valueChanged.connect(lambda value, field=field: setattr(self.gui_params, field, value))
 
     def connect_preview_signals(self):
-        # Window 1
-        self.ui.window1_min_sb.valueChanged.connect(self.plot_window1_preview)
-        self.ui.window1_max_sb.valueChanged.connect(self.plot_window1_preview)
-        self.ui.window1_min_hs.valueChanged.connect(self.plot_window1_preview)
-        self.ui.window1_max_hs.valueChanged.connect(self.plot_window1_preview)
-        # Window 2
-        self.ui.window2_min_sb.valueChanged.connect(self.plot_window2_preview)
-        self.ui.window2_max_sb.valueChanged.connect(self.plot_window2_preview)
-        self.ui.window2_min_hs.valueChanged.connect(self.plot_window2_preview)
-        self.ui.window2_max_hs.valueChanged.connect(self.plot_window2_preview)
-        # Dark Frame
-        self.ui.dark_min_sb.valueChanged.connect(self.plot_dark_preview)
-        self.ui.dark_max_sb.valueChanged.connect(self.plot_dark_preview)
-        self.ui.dark_min_hs.valueChanged.connect(self.plot_dark_preview)
-        self.ui.dark_max_hs.valueChanged.connect(self.plot_dark_preview)
-        # Lifetime
-        self.ui.lifetime_min_sb.valueChanged.connect(self.plot_lifetime_preview)
-        self.ui.lifetime_max_sb.valueChanged.connect(self.plot_lifetime_preview)
-        self.ui.lifetime_min_hs.valueChanged.connect(self.plot_lifetime_preview)
-        self.ui.lifetime_max_hs.valueChanged.connect(self.plot_lifetime_preview)
+        # dragging a slider emits valueChanged for every step.
+        # instead of redrawing on each signal, the first change starts a single-shot timer per preview
+        # and further changes while it runs are ignored, so the preview redraws at most once per 16 ms
+        # and keeps following the slider while dragging
+        self._preview_timers = {}
+        for name, plot_function in (('window1', self.plot_window1_preview), ('window2', self.plot_window2_preview),
+                                    ('dark', self.plot_dark_preview), ('lifetime', self.plot_lifetime_preview)):
+            timer = QTimer(self)
+            timer.setSingleShot(True)
+            timer.setInterval(16)
+            timer.timeout.connect(plot_function)
+            self._preview_timers[name] = timer
+            for widget in (f"{name}_min_sb", f"{name}_max_sb", f"{name}_min_hs", f"{name}_max_hs"):
+                getattr(self.ui, widget).valueChanged.connect(lambda _value, timer=timer: self.schedule_preview(timer))
+
+    @staticmethod
+    def schedule_preview(timer):
+        # a running timer is not restarted, otherwise continuous dragging would postpone the redraw until release
+        if not timer.isActive():
+            timer.start()
 
 #endregion
 
 #region plotting
 
-    def plot_window1_preview(self):
-        if self.rld and self.rld.image_dict and len(self.rld.image_dict["window1"]) > 0:
-            # for RGB images, preview only the first channel
-            if self.rld.image_dict["window1"][0].ndim == 3 and self.rld.image_dict["window1"][0].shape[2] == 3:
-                window1_img = self.rld.image_dict["window1"][0][:, :, 0]
-            else:
-                window1_img = self.rld.image_dict["window1"][0]
-            window1_min = self.ui.window1_min_sb.value()
-            window1_max = self.ui.window1_max_sb.value()
-            self.ui.window1_lbl.set_image(window1_img, vmin=window1_min, vmax=window1_max, cmap='gray')
+    def preview_channel(self, name, img):
+        # for RGB images, preview only the first channel. cv2.extractChannel copies it in a single pass into a contiguous
+        # image that OpenCV can normalize directly. the copy is kept as long as the same source image is shown,
+        # so it is not extracted again on every redraw and the normalized preview in ImageLabel stays cached
+        if img.ndim == 3 and img.shape[2] == 3:
+            cached = self._channel_cache.get(name)
+            if cached is None or cached[0] is not img:
+                cached = (img, cv2.extractChannel(img, 0))
+                self._channel_cache[name] = cached
+            return cached[1]
+        return img
+
+    def first_image(self, key):
+        # first image of the given kind in the current measurement, None if there is none
+        image_dict = self.rld.image_dict if self.rld else None
+        return image_dict[key][0] if image_dict and image_dict.get(key) else None
+
+    def _plot_preview(self, name, img, cmap, empty_text):
+        label, min_sb, max_sb = self._preview_widgets[name]
+        if img is not None:
+            label.set_image(self.preview_channel(name, img), vmin=min_sb.value(), vmax=max_sb.value(), cmap=cmap)
         else:
-            # Clear the label if no window1 image is available
-            self.ui.window1_lbl.clear()
-            self.ui.window1_lbl.setText("No window 1 image")
-            self.ui.window1_lbl.setAlignment(Qt.AlignCenter)
+            # Clear the label if no image is available
+            label.clear()
+            label.setText(empty_text)
+            label.setAlignment(Qt.AlignCenter)
+
+    def plot_window1_preview(self):
+        self._plot_preview("window1", self.first_image("window1"), 'gray', "No window 1 image")
 
     def plot_window2_preview(self):
-        if self.rld and self.rld.image_dict and len(self.rld.image_dict["window2"]) > 0:
-            if self.rld.image_dict["window2"][0].ndim == 3 and self.rld.image_dict["window2"][0].shape[2] == 3:
-                window2_img = self.rld.image_dict["window2"][0][:, :, 0]
-            else:
-                window2_img = self.rld.image_dict["window2"][0]
-            window2_min = self.ui.window2_min_sb.value()
-            window2_max = self.ui.window2_max_sb.value()
-            self.ui.window2_lbl.set_image(window2_img, vmin=window2_min, vmax=window2_max, cmap='gray')
-        else:
-            # Clear the label if no window2 image is available
-            self.ui.window2_lbl.clear()
-            self.ui.window2_lbl.setText("No window 2 image")
-            self.ui.window2_lbl.setAlignment(Qt.AlignCenter)
+        self._plot_preview("window2", self.first_image("window2"), 'gray', "No window 2 image")
 
     def plot_dark_preview(self):
-        if self.rld and self.rld.image_dict and len(self.rld.image_dict["dark"]) > 0:
-            if self.rld.image_dict["dark"][0].ndim == 3 and self.rld.image_dict["dark"][0].shape[2] == 3:
-                dark_img = self.rld.image_dict["dark"][0][:, :, 0]
-            else:
-                dark_img = self.rld.image_dict["dark"][0]
-            dark_min = self.ui.dark_min_sb.value()
-            dark_max = self.ui.dark_max_sb.value()
-            self.ui.dark_lbl.set_image(dark_img, vmin=dark_min, vmax=dark_max, cmap='gray')
-        else:
-            # Clear the label if no dark image is available
-            self.ui.dark_lbl.clear()
-            self.ui.dark_lbl.setText("No dark image")
-            self.ui.dark_lbl.setAlignment(Qt.AlignCenter)
+        self._plot_preview("dark", self.first_image("dark"), 'gray', "No dark image")
 
     def plot_lifetime_preview(self):
-        if self.rld and self.rld.average_lifetime is not None:
-            if self.rld.average_lifetime.ndim == 3 and self.rld.average_lifetime.shape[2] == 3:
-                lifetime_img = self.rld.average_lifetime[:, :, 0]
-            else:
-                lifetime_img = self.rld.average_lifetime
-            lifetime_min = self.ui.lifetime_min_sb.value()
-            lifetime_max = self.ui.lifetime_max_sb.value()
-            self.ui.lifetime_lbl.set_image(lifetime_img, vmin=lifetime_min, vmax=lifetime_max, cmap='plasma')
-        else:
-            # Clear the label if no lifetime image is available
-            self.ui.lifetime_lbl.clear()
-            self.ui.lifetime_lbl.setText("No lifetime image")
-            self.ui.lifetime_lbl.setAlignment(Qt.AlignCenter)
+        self._plot_preview("lifetime", self.rld.average_lifetime if self.rld else None, 'plasma', "No lifetime image")
 
     def plot_preview_images(self):
         self.plot_window1_preview()
@@ -402,32 +562,13 @@ class MainWindow(QMainWindow):
 
 #region Event handler functions
 
-    def validate_delay1_sb(self):
-        difference = self.ui.delay1_sb.value() % 0.0625
-        if difference > 0:
-            if (difference > 0.03125):
-                new_value = self.ui.delay1_sb.value() + (0.0625 - difference)
-            else:
-                new_value = self.ui.delay1_sb.value() - difference                
-            self.ui.delay1_sb.setValue(new_value)
-
-    def validate_delay2_sb(self):
-        difference = self.ui.delay2_sb.value() % 0.0625
-        if difference > 0:
-            if (difference > 0.03125):
-                new_value = self.ui.delay2_sb.value() + (0.0625 - difference)
-            else:
-                new_value = self.ui.delay2_sb.value() - difference                
-            self.ui.delay2_sb.setValue(new_value)
-
-    def validate_pulse_width_sb(self):
-        difference = self.ui.pulse_width_sb.value() % 0.0625
-        if difference > 0:
-            if (difference > 0.03125):
-                new_value = self.ui.pulse_width_sb.value() + (0.0625 - difference)
-            else:
-                new_value = self.ui.pulse_width_sb.value() - difference                
-            self.ui.pulse_width_sb.setValue(new_value)
+    @staticmethod
+    def _snap_16th(sb):
+        # the controller works in steps of 1/16 us, round to the nearest step
+        value = sb.value()
+        snapped = round(value * 16) / 16
+        if snapped != value:
+            sb.setValue(snapped) # emits valueChanged, so the snapped value also ends up in gui_params
 
     def image_tau(self):
         self.rld = RLD_manager.RLD() # prepare new measurement
@@ -453,16 +594,21 @@ class MainWindow(QMainWindow):
             if not os.path.exists(folder):
                 os.makedirs(folder)
             self.save_measurement(folder)
-        self.plot_preview_images()   
+        # the previews were already redrawn by change_measurement_selection (currentIndexChanged of the combo box)
 
     def load_measurement(self):
         #get image set folder from user. Open folder selection dialog
         data_folder_path = QFileDialog.getExistingDirectory(self, "Select Data Folder", os.getcwd())
         if not data_folder_path:
             return  # User cancelled    
-        self.rld = RLD_manager.RLD() 
-        load_image_status = self.rld.load_images_from_folder(data_folder_path)
-
+        # reading the images and calculating the lifetime image takes a while, done in the background. continued in on_measurement_loaded
+        self.ui.load_image_sets_btn.setEnabled(False)
+        self._load_worker = MeasurementLoadWorker(data_folder_path)
+        self._load_worker.ready.connect(self.on_measurement_loaded)
+        self._load_worker.finished.connect(lambda: self.ui.load_image_sets_btn.setEnabled(True)) # also if loading failed with an exception
+        self._load_worker.start()
+
+    def on_measurement_loaded(self, rld, load_image_status, config_file_status):
         if load_image_status == 0:
            pass 
         elif not load_image_status:
@@ -479,24 +625,22 @@ class MainWindow(QMainWindow):
             msg.setWindowTitle("Warning")
             msg.exec()
 
-        config_path = next((os.path.join(data_folder_path, f) for f in os.listdir(data_folder_path) if f.endswith('.conf')), "")
-        config_file_status = self.rld.load_settings_from_file(config_path)
-
+        self.rld = rld
+        # not done in MeasurementLoadWorker: numba's default threading layer aborts when a parallel kernel is
+        # entered from two threads at once, and the GUI thread runs the parallel colormap kernel
+        self.rld.calculate_average_lifetime()
         if config_file_status == 0:
             self.apply_settings_to_gui() 
         else:
             self.config_file_error_popup(config_file_status)
 
-        self.rld.calculate_average_lifetime()
-
         self.rld_list.append(self.rld)
         # add new measurement to combo box
         self.ui.select_measurement_cb.addItem(f"{len(self.rld_list)} (loaded)")
         #change selection of combo box to the newly loaded measurement
         self.ui.select_measurement_cb.setCurrentIndex(len(self.rld_list)-1)
         print(f"number of measurements in session: {len(self.rld_list)}")
-
-        self.plot_preview_images()
+        # the previews were already redrawn by change_measurement_selection (currentIndexChanged of the combo box)
 
     def config_file_error_popup(self, config_file_status):
         if config_file_status == -1:
@@ -540,20 +684,64 @@ class MainWindow(QMainWindow):
             return  # User cancelled
         self.save_measurement(file_path)
 
+    @staticmethod
+    def write_image_file(path, img):
+        # encodes the image in memory and writes it to a temporary file that replaces the final file only when it
+        # was written completely, so a failed or interrupted save does not leave truncated images behind
+        ok, buf = cv2.imencode(os.path.splitext(path)[1], img)
+        if not ok:
+            raise OSError(f"Could not encode image {path}")
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as tmp_file:
+                tmp_file.write(buf) # buffered write, retries until the whole buffer is written (raises otherwise)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def wait_for_pending_writes(self):
+        # blocks until all submitted image files are written
+        wait(self.save_futures)
+        self.save_futures = []
+
+    def check_image_write(self, path, future):
+        # runs in the writer thread (or directly, if the write was already finished)
+        error = future.exception()
+        if error is not None:
+            print(f"Error saving image {path}: {error}")
+            self.image_write_failed.emit(f"{path}: {error}")
+
+    def on_image_write_failed(self, message):
+        self._write_errors.append(message)
+        self._write_error_timer.start()
+
+    def show_write_errors(self):
+        errors, self._write_errors = self._write_errors, []
+        msg = QMessageBox()
+        msg.setIcon(QMessageBox.Warning)
+        msg.setText(f"Error: Saving {len(errors)} image(s) failed.\n{errors[0]}")
+        msg.setWindowTitle("Error")
+        msg.exec()
+
     def save_measurement(self, file_path = None):
         #todo: enable button only when there are images to save
 
         #save raw images, average lifetime image, and settings.conf
         #probably better to move to RLD manager class later and just pass the file path here (also config file and timestamps)
         if self.rld and self.rld.image_dict and len(self.rld.image_dict.get("window1", [])) > 0 and len(self.rld.image_dict.get("window2", [])) > 0 and len(self.rld.image_dict.get("dark", [])) > 0:
-            for i, img in enumerate(self.rld.image_dict.get("window1", [])):
-                cv2.imwrite(os.path.join(file_path, f"window1_{i:03d}.tif"), img) 
-            for i, img in enumerate(self.rld.image_dict.get("window2", [])):
-                cv2.imwrite(os.path.join(file_path, f"window2_{i:03d}.tif"), img) 
-            for i, img in enumerate(self.rld.image_dict.get("dark", [])):
-                cv2.imwrite(os.path.join(file_path, f"dark_{i:03d}.tif"), img)
+            # the images of a measurement are not modified after acquisition/loading, so they can be written while the GUI continues
+            folder_prefix = os.path.join(file_path, "") # joined once, file names are appended to it
+            tasks = [(f"{folder_prefix}{key}_{i:03d}.tif", img) for key in ("window1", "window2", "dark") for i, img in enumerate(self.rld.image_dict[key])]
             if self.rld.average_lifetime is not None:
-                cv2.imwrite(os.path.join(file_path, "lifetime_image.tif"), self.rld.average_lifetime)
+                tasks.append((folder_prefix + "lifetime_image.tif", self.rld.average_lifetime))
+            # a previous save may still write to the same folder (same file names and .tmp files), so it is finished first
+            self.wait_for_pending_writes()
+            for path, img in tasks:
+                future = self.save_executor.submit(self.write_image_file, path, img)
+                future.add_done_callback(lambda future, path=path: self.check_image_write(path, future))
+                self.save_futures.append(future)
         else:
             msg = QMessageBox()
             msg.setIcon(QMessageBox.Warning)
@@ -564,33 +752,21 @@ class MainWindow(QMainWindow):
 
         #save settings.conf
         #right now, if the settings are loaded from file AFTER acquiring images, the wrong settings are saved.
-        config = configparser.ConfigParser()
-        config['ImagingParameters'] = {
-            'exposure_time_us': str(self.rld.params.exposure_time_us),
-            'delay_window1_us': str(self.rld.params.delay_window1_us),
-            'delay_window2_us': str(self.rld.params.delay_window2_us),
-            'end_delay_us': str(self.rld.params.end_delay_us),
-            'pulse_width_us': str(self.rld.params.pulse_width_us),
-            'light_intensity': str(self.rld.params.light_intensity),
-            'sets_to_acquire': str(self.rld.params.sets_to_acquire),
-            'exposures_per_frame': str(self.rld.params.exposures_per_frame),
-        }
         with open(os.path.join(file_path, 'settings.conf'), 'w') as configfile:
-            config.write(configfile)
+            configfile.write(self.rld.params.settings_file_text())
 
 
         if self.rld.start_time_ns and self.rld.end_time_ns:    # this is not guaranteed to be available if images were loaded from a folder
-            #write timestamps to a text file
+            #write timestamps to a text file. the text is assembled in memory and written with a single write call
+            lines = [f"Start timestamp: {self.rld.start_time_ns}\n",
+                     f"End timestamp: {self.rld.end_time_ns}\n",
+                     f"Start time: {self.rld.start_time_str}\n",
+                     f"End time: {self.rld.end_time_str}\n",
+                     "Image acquisition timestamps (window, index, timestamp):\n"]
+            for key, ts_list in self.rld.image_start_time_dict.items():
+                lines.extend(f"{key}, {index}, {timestamp}\n" for index, timestamp in enumerate(ts_list))
             with open(os.path.join(file_path, 'timestamps.txt'), 'w') as timestamps_file:
-                #start time
-                timestamps_file.write(f"Start timestamp: {self.rld.start_time_ns}\n")
-                timestamps_file.write(f"End timestamp: {self.rld.end_time_ns}\n")
-                timestamps_file.write(f"Start time: {time.strftime('%Y-%m-%d %H:%M:%S', self.rld.start_time_localtime)}:{self.rld.start_time_localtime_ms:.3f}\n")
-                timestamps_file.write(f"End time: {time.strftime('%Y-%m-%d %H:%M:%S',self.rld.end_time_localtime)}:{self.rld.end_time_localtime_ms:.3f}\n")
-                timestamps_file.write("Image acquisition timestamps (window, index, timestamp):\n")
-                for key, ts_list in self.rld.image_start_time_dict.items():
-                    for index, timestamp in enumerate(ts_list):
-                        timestamps_file.write(f"{key}, {index}, {timestamp}\n")
+                timestamps_file.write("".join(lines))
 
     def change_measurement_selection(self):
         #change measurement to selection in combo box
@@ -634,36 +810,14 @@ class MainWindow(QMainWindow):
         file_path, _ = QFileDialog.getSaveFileName(self, "Save Settings File", "settings.conf", "Config Files (*.conf);;All Files (*)")
         if not file_path:
             return
-        self.extract_gui_inputs()
-        config = configparser.ConfigParser()
-        config['ImagingParameters'] = {
-            'exposure_time_us': str(self.rld.params.exposure_time_us),
-            'delay_window1_us': str(self.rld.params.delay_window1_us),
-            'delay_window2_us': str(self.rld.params.delay_window2_us),
-            'end_delay_us': str(self.rld.params.end_delay_us),
-            'pulse_width_us': str(self.rld.params.pulse_width_us),
-            'light_intensity': str(self.rld.params.light_intensity),
-            'sets_to_acquire': str(self.rld.params.sets_to_acquire),
-            'exposures_per_frame': str(self.rld.params.exposures_per_frame),
-        }
         with open(file_path, 'w') as configfile:
-            config.write(configfile)
+            configfile.write(self.gui_params.settings_file_text())
 
 #endregion
 
     def extract_gui_inputs(self):
-        """Extract user inputs from GUI spinboxes and store them in an ImagingParameters instance."""
-        params = ImagingParameters(
-            exposure_time_us=self.ui.exposure_sb.value(),
-            delay_window1_us=self.ui.delay1_sb.value(),
-            delay_window2_us=self.ui.delay2_sb.value(),
-            end_delay_us=self.ui.end_delay_sb.value(),
-            pulse_width_us=self.ui.pulse_width_sb.value(),
-            light_intensity=self.ui.light_intensity_sb.value(),
-            sets_to_acquire=self.ui.sets_to_acquire_sb.value(),
-            exposures_per_frame=self.ui.exposures_per_frame_sb.value(),
-        )
-        self.rld.params = params
+        """Store the user inputs from the GUI spinboxes (tracked in gui_params) in the current RLD instance."""
+        self.rld.params = copy.copy(self.gui_params)  # copy: later GUI changes must not alter the parameters of this measurement
         #print("Extracted parameters:", params)
 
 if __name__ == "__main__":
@@ -0,0 +1,81 @@
+"""
+Regression tests for the lifetime calculation in RLD_manager (memory use and accuracy).
+
+Run with: python -m pytest tests
+"""
+
+import os
+import sys
+import tracemalloc
+
+import numpy as np
+import pytest
+
+pytest.importorskip("ximea")  # RLD_manager imports the camera API
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import RLD_manager
+from RLD_manager import RLD
+
+DELTA_T = 20.0
+
+
+def chained_lifetime(delta_t, arr_window1, arr_window2):
+    # the original implementation: a chain of arr_replace_* copies
+    return delta_t / RLD.arr_replace_negatives_by_nan(RLD.arr_replace_zeroes_by_nan(
+        np.log(RLD.arr_replace_zeroes_by_nan(arr_window1) / RLD.arr_replace_zeroes_by_nan(arr_window2))))
+
+
+@pytest.fixture
+def windows():
+    # averaged, dark subtracted windows: float32 with zeros, equal values and ratios below one
+    rng = np.random.default_rng(0)
+    arr_window1 = rng.integers(0, 4000, size=(512, 512)).astype(np.float32)
+    arr_window2 = rng.integers(0, 4000, size=(512, 512)).astype(np.float32)
+    arr_window2[::7, ::5] = 0
+    arr_window1[::11, ::3] = arr_window2[::11, ::3]
+    return arr_window1, arr_window2
+
+
+@pytest.fixture(params=["numpy", "numba"])
+def lifetime_path(request, monkeypatch):
+    if request.param == "numpy":
+        monkeypatch.setattr(RLD_manager, "_lifetime_kernel", None)
+    elif RLD_manager._lifetime_kernel is None:
+        pytest.skip("numba not installed")
+    return request.param
+
+
+def test_peak_memory(windows, lifetime_path):
+    arr_window1, arr_window2 = windows
+    tracemalloc.start()
+    try:
+        RLD.calculate_lifetime(DELTA_T, arr_window1, arr_window2)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak < 3 * arr_window1.nbytes
+
+
+def test_same_result_as_chained_masks(windows, lifetime_path):
+    arr_window1, arr_window2 = windows
+    result = RLD.calculate_lifetime(DELTA_T, arr_window1, arr_window2)
+    expected = chained_lifetime(DELTA_T, arr_window1, arr_window2)
+    assert result.dtype == np.float32
+    # same invalid (nan) pixels, values within float32 precision (approximate log in the numba kernel)
+    np.testing.assert_allclose(result, expected, rtol=1e-6 if lifetime_path == "numpy" else 1e-4, equal_nan=True)
+
+
+def test_float32_accuracy(windows, lifetime_path):
+    arr_window1, arr_window2 = windows
+    result = RLD.calculate_lifetime(DELTA_T, arr_window1, arr_window2)
+    # float64 reference with np.log
+    ratio = arr_window1.astype(np.float64) / np.where(arr_window2 != 0, arr_window2, np.nan)
+    valid = ratio > 1
+    reference = np.full(ratio.shape, np.nan)
+    reference[valid] = DELTA_T / np.log(ratio[valid])
+    assert np.array_equal(np.isnan(result), ~valid)
+    # for ratios close to 1, rounding the ratio to float32 alone gives a relative error of ~6e-8 / log(ratio).
+    # those are lifetimes of more than 1000 times the window delay, far outside of what can be measured
+    measurable = valid & (ratio >= 1.001)
+    relative_error = np.abs(result[measurable] - reference[measurable]) / reference[measurable]
+    assert relative_error.max() < 1e-4
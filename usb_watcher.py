@@ -9,6 +9,9 @@ from PySide6.QtCore import QThread, Signal
 from usbmonitor import USBMonitor
 from usbmonitor.attributes import ID_MODEL, ID_MODEL_ID, ID_VENDOR_ID
 
+# kinds of devices returned by USBWatcher.device_filter and emitted with usb_event
+_KIND_CTRL = "controller"
+_KIND_CAMERA = "camera"
 
 class USBWatcher(QThread):
     usb_event = Signal(str, str)  # action ("add"/"remove"), formatted device string
@@ -21,31 +24,34 @@ class USBWatcher(QThread):
         {"ID_VENDOR_ID" : XIMEA_VID} 
     )
 
+    _VID_TO_KIND = {ARDUINO_VID: _KIND_CTRL, XIMEA_VID: _KIND_CAMERA} # new device types only need an entry here
+
 
     def __init__(self):
         super().__init__()
         self._monitor = USBMonitor(filter_devices=self.device_filter_tuple)
         self.controllers = {}
         self.cameras = {}
+        self._kind_by_id = {} # dev_id -> "controller"/"camera", classified once when the device is found
+
+        self._refresh()
 
-        self.update_controllers()
-        self.update_cameras()
+    # derived from the device dicts, so they cannot get out of sync with them
+    @property
+    def number_of_controllers(self):
+        return len(self.controllers)
 
-        self.number_of_controllers = len(self.controllers)
-        self.number_of_cameras = len(self.cameras) # number of ximea cameras can also be inferred through xiapi.Camera().get_number_devices() function
+    @property
+    def number_of_cameras(self):
+        # authoritative number of ximea cameras. comes from the enumeration of usbmonitor (sysfs on Linux),
+        # xiapi.Camera().get_number_devices() should not be used for this, since it communicates with every camera
+        return len(self.cameras)
 
 
     # Formatter & filter for Arduino/Ximea devices
     @staticmethod
     def device_filter(info):
-        vid = info.get(ID_VENDOR_ID)
-        if vid == USBWatcher.ARDUINO_VID:
-            return "controller"
-        elif vid == USBWatcher.XIMEA_VID:
-            #print(f"Detected camera: {info}")
-            return "camera"
-        else:
-            return None  # skip non-Arduino/XIMEA devices
+        return USBWatcher._VID_TO_KIND.get(info.get(ID_VENDOR_ID))  # None: skip non-Arduino/XIMEA devices
         #model = info.get(ID_MODEL, "Unknown")
         #pid = info.get(ID_MODEL_ID, "??")
         #return f"{model} (VID:PID={vid}:{pid})"
@@ -55,54 +61,54 @@ class USBWatcher(QThread):
         def on_connect(dev_id, info):
             #print(f"dev_id: {dev_id}, info: {info}")
             type_of_device = self.device_filter(info)
-            if "controller" in type_of_device:
-                self.usb_event.emit("added", type_of_device)
+            if type_of_device is None:
+                return # not a controller or camera. an exception here would stop further events from usbmonitor
+            # the dicts are updated before the event is emitted, so the numbers of devices are up to date in the slots
+            if type_of_device == _KIND_CTRL:
                 self.controllers[dev_id] = info
-                self.number_of_controllers += 1
-            elif "camera" in type_of_device:
+                self._kind_by_id[dev_id] = type_of_device
                 self.usb_event.emit("added", type_of_device)
+            elif type_of_device == _KIND_CAMERA:
                 self.cameras[dev_id] = info
-                self.number_of_cameras += 1
+                self._kind_by_id[dev_id] = type_of_device
+                self.usb_event.emit("added", type_of_device)
 
         def on_disconnect(dev_id, info):
-            type_of_device = self.device_filter(info)
-            if "controller" in type_of_device:
-                self.usb_event.emit("removed", type_of_device)
+            # classified when the device was connected (or found at startup), info does not need to be checked again
+            type_of_device = self._kind_by_id.pop(dev_id, None)
+            if type_of_device is None:
+                return
+            if type_of_device == _KIND_CTRL:
                 self.controllers.pop(dev_id, None)
-                self.number_of_controllers -= 1
-            elif "camera" in type_of_device:
                 self.usb_event.emit("removed", type_of_device)
+            elif type_of_device == _KIND_CAMERA:
                 self.cameras.pop(dev_id, None)
-                self.number_of_cameras -= 1
+                self.usb_event.emit("removed", type_of_device)
 
         self._monitor.start_monitoring(
             on_connect=on_connect,
             on_disconnect=on_disconnect
         )
 
-    def update_controllers(self):
+    def _refresh(self):
+        # one-shot initial population of the device dicts. afterwards they are kept up to date by the hotplug
+        # callbacks in run() (and the GUI follows usb_event), so there is no need to poll the device list again.
+        # enumerating the USB devices is slow, so controllers and cameras are sorted out of a single enumeration
         self.controllers = {}
+        self.cameras = {}
+        self._kind_by_id = {}
         connected_devices = self._monitor.get_available_devices()
         if not connected_devices:
             return None
 
         for device, info in connected_devices.items():
             type_of_device = self.device_filter(info)
-            if "controller" in type_of_device:
+            if type_of_device == _KIND_CTRL:
                 self.controllers[device] = info
-    
-    def update_cameras(self):
-        self.cameras = {}
-        connected_devices = self._monitor.get_available_devices()
-
-        if not connected_devices:
-            return None
-        
-        for device, info in connected_devices.items():
-            type_of_device = self.device_filter(info)
-            if type_of_device == "camera":
+                self._kind_by_id[device] = type_of_device
+            elif type_of_device == _KIND_CAMERA:
                 self.cameras[device] = info
-        return self.cameras 
+                self._kind_by_id[device] = type_of_device
 
 
 